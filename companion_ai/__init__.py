@@ -4,3 +4,8 @@ Haro - A voice-activated AI assistant for Raspberry Pi
 
 __version__ = "1.0.0"
 __author__ = "Haro AI Team"
+
+from .config import Config
+from .utils import logger
+
+__all__ = ["Config", "logger"]
@@ -1,24 +1,58 @@
 """
 AI brain - handles conversation and OpenAI integration
 """
+import asyncio
+import hashlib
+import importlib.util
 import json
-from typing import List, Dict, Optional
-from openai import OpenAI
+import os
+import random
+from collections import deque
+from queue import Queue
+from typing import Callable, Deque, Iterator, List, Dict, Optional
+import httpx
+from openai import AsyncOpenAI
+from .config import Config
+from .response_cache import ResponseCache
+from .utils import get_event_loop, logger, run_coroutine, split_sentences
+
 try:
-    from .config import Config
-    from .utils import logger
+    import tiktoken
 except ImportError:
-    from config import Config
-    from utils import logger
+    tiktoken = None
+
+# Routes every conversation request to the provider's cache for the fixed system prompt
+_PROMPT_CACHE_KEY = hashlib.sha256(Config.AI_PERSONALITY.encode()).hexdigest()[:32]
 
 class AIBrain:
     """Handles AI conversation logic and OpenAI integration"""
     
+    __slots__ = (
+        "client", "_system_msg", "_tail", "_tok_counts", "_tok_total", "_encoding",
+        "user_context", "last_intent", "_rng", "response_cache"
+    )
+    
+    # One client per process so every brain shares the same connection pool
+    _shared_client: Optional[AsyncOpenAI] = None
+    
     def __init__(self):
         """Initialize the AI brain"""
         self.client = None
-        self.conversation_history: List[Dict[str, str]] = []
+        self._system_msg: Dict[str, str] = {}
+        self._tail: Deque[Dict[str, str]] = deque(maxlen=Config.MAX_CONVERSATION_HISTORY * 2)
+        self._tok_counts: Deque[int] = deque(maxlen=Config.MAX_CONVERSATION_HISTORY * 2)  # Parallel to _tail
+        self._tok_total = 0
+        self._encoding = self._load_encoding()
         self.user_context: Dict[str, str] = {}
+        self.last_intent: Optional[Dict[str, any]] = None
+        self._rng = random.Random()
+        self.response_cache = ResponseCache(
+            max_size=Config.RESPONSE_CACHE_SIZE,
+            path=os.path.join(Config.CACHE_DIR, "responses.db"),
+            similarity_threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+            ttl=Config.RESPONSE_CACHE_TTL,
+            semantic=Config.SEMANTIC_CACHE
+        )
         
         self._initialize_openai()
         self._initialize_conversation()
@@ -29,99 +63,270 @@ class AIBrain:
             if not Config.OPENAI_API_KEY:
                 raise ValueError("OpenAI API key not found in environment variables")
             
-            self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            if AIBrain._shared_client is None:
+                AIBrain._shared_client = AsyncOpenAI(
+                    api_key=Config.OPENAI_API_KEY,
+                    http_client=self._create_http_client()
+                )
+            self.client = AIBrain._shared_client
             logger.info("OpenAI client initialized successfully")
             
-            # Test the connection
-            self._test_connection()
+            # Test the connection (this also opens the first pooled connection)
+            run_coroutine(self._test_connection())
             
         except Exception as e:
-            logger.error(f"Failed to initialize OpenAI client: {e}")
+            logger.error("Failed to initialize OpenAI client: %s", e)
             raise
     
-    def _test_connection(self) -> None:
+    @staticmethod
+    def _create_http_client() -> httpx.AsyncClient:
+        """Create an HTTP client that keeps connections to OpenAI warm between turns"""
+        # HTTP/2 needs the optional h2 package
+        http2 = importlib.util.find_spec("h2") is not None
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            retries=2,
+            limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=Config.OPENAI_KEEPALIVE)
+        )
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(Config.OPENAI_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT)
+        )
+    
+    async def _test_connection(self) -> None:
         """Test OpenAI connection with a simple request"""
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=Config.OPENAI_MODEL,
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=10
             )
             logger.info("OpenAI connection test successful")
         except Exception as e:
-            logger.error(f"OpenAI connection test failed: {e}")
+            logger.error("OpenAI connection test failed: %s", e)
             raise
     
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """System message followed by the recent conversation"""
+        return [self._system_msg, *self._tail]
+    
     def _initialize_conversation(self) -> None:
         """Initialize conversation with system prompt"""
         system_message = {
             "role": "system",
             "content": Config.AI_PERSONALITY
         }
-        self.conversation_history.append(system_message)
+        self._system_msg = system_message
         logger.info("Conversation initialized with AI personality")
     
-    def process_input(self, user_input: str) -> str:
+    def process_input(self, user_input: str, with_intent: bool = False,
+                      on_sentence: Optional[Callable[[str], None]] = None) -> str:
         """
         Process user input and generate AI response
         
         Args:
             user_input: The user's spoken input
+            with_intent: Also analyze the intent (stored in last_intent)
+            on_sentence: Called with each sentence as soon as it is generated
             
         Returns:
             AI response text
         """
-        try:
-            logger.info(f"Processing user input: '{user_input}'")
-            
-            # Add user message to conversation history
-            user_message = {"role": "user", "content": user_input}
-            self.conversation_history.append(user_message)
-            
-            # Generate AI response
-            response = self._generate_response()
-            
-            # Add AI response to conversation history
-            ai_message = {"role": "assistant", "content": response}
-            self.conversation_history.append(ai_message)
-            
-            # Manage conversation history size
-            self._manage_conversation_history()
+        return run_coroutine(self.aprocess_input(user_input, with_intent, on_sentence))
+    
+    def stream_input(self, user_input: str) -> Iterator[str]:
+        """
+        Process user input, yielding the response sentence by sentence as it is generated
+        
+        Args:
+            user_input: The user's spoken input
             
-            logger.info(f"Generated response: '{response}'")
-            return response
+        Yields:
+            AI response sentences
+        """
+        # Sentences are produced on the event loop thread and consumed here
+        sentences: "Queue[Optional[str]]" = Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._respond(user_input, on_sentence=sentences.put), get_event_loop()
+        )
+        future.add_done_callback(lambda _: sentences.put(None))
+        
+        while (sentence := sentences.get()) is not None:
+            yield sentence
+        
+        # A failure can come after some sentences were already yielded
+        error = future.exception()
+        if error is not None:
+            logger.error("Error processing input: %s", error)
+            yield self._get_error_response()
+    
+    async def aprocess_input(self, user_input: str, with_intent: bool = False,
+                             on_sentence: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Process user input and generate AI response asynchronously
+        
+        Args:
+            user_input: The user's spoken input
+            with_intent: Also analyze the intent (stored in last_intent)
+            on_sentence: Called with each sentence as soon as it is generated
             
+        Returns:
+            AI response text
+        """
+        try:
+            return await self._respond(user_input, with_intent, on_sentence)
         except Exception as e:
-            logger.error(f"Error processing input: {e}")
+            logger.error("Error processing input: %s", e)
             return self._get_error_response()
     
-    def _generate_response(self) -> str:
-        """Generate AI response using OpenAI"""
+    async def _respond(self, user_input: str, with_intent: bool = False,
+                       on_sentence: Optional[Callable[[str], None]] = None) -> str:
+        """Generate the response for user input, raising on failure"""
+        logger.info("Processing user input: '%s'", user_input)
+        
+        # The reply the user is answering, follow-ups like "yes" or "why?" depend on it
+        context = self._tail[-1]["content"] if self._tail and self._tail[-1]["role"] == "assistant" else ""
+        
+        # Add user message to conversation history
+        user_message = {"role": "user", "content": user_input}
+        self._append_message(user_message)
+        
+        try:
+            # Check the response cache before calling OpenAI
+            cache_key = ResponseCache.make_key(Config.AI_PERSONALITY, user_input, context)
+            response = self.response_cache.get(cache_key)
+            embedding = None
+            # Similarity ignores context, so only conversation openers use the semantic tier
+            if response is None and self.response_cache.semantic and not context:
+                embedding = await self._embed(user_input)
+                response = self.response_cache.find_similar(embedding)
+            
+            if response is not None:
+                logger.debug("Using cached response")
+                if on_sentence:
+                    for sentence in split_sentences(response):
+                        if sentence:
+                            on_sentence(sentence)
+                if with_intent:
+                    self.last_intent = await self.analyze_intent(user_input)
+            else:
+                # Generate AI response, analyzing intent concurrently if requested
+                if with_intent:
+                    response, self.last_intent = await asyncio.gather(
+                        self._generate_response(on_sentence),
+                        self.analyze_intent(user_input)
+                    )
+                else:
+                    response = await self._generate_response(on_sentence)
+                self.response_cache.put(cache_key, response, embedding)
+        except Exception:
+            # Don't leave an unanswered user message in the history
+            self._discard_last_message(user_message)
+            raise
+        
+        # Add AI response to conversation history
+        ai_message = {"role": "assistant", "content": response}
+        self._append_message(ai_message)
+        
+        logger.info("Generated response: '%s'", response)
+        return response
+    
+    async def _generate_response(self, on_sentence: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Generate AI response using OpenAI, streaming it sentence by sentence
+        
+        Args:
+            on_sentence: Called with each complete sentence while the rest is still generating
+            
+        Returns:
+            Full AI response text
+        """
         try:
-            response = self.client.chat.completions.create(
+            stream = await self.client.chat.completions.create(
                 model=Config.OPENAI_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
-                messages=self.conversation_history,
+                messages=[self._system_msg, *self._tail],
                 max_tokens=150,  # Keep responses concise for speech
                 temperature=0.7,  # Balanced creativity
+                stream=True,
+                extra_body={"prompt_cache_key": _PROMPT_CACHE_KEY}
             )
             
-            return response.choices[0].message.content.strip()
+            parts = []
+            pending = ""
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                parts.append(delta)
+                
+                if on_sentence:
+                    # Hand over every finished sentence, keep the unfinished tail
+                    *sentences, pending = split_sentences(pending + delta)
+                    for sentence in sentences:
+                        if sentence.strip():
+                            on_sentence(sentence.strip())
+            
+            if on_sentence and pending.strip():
+                on_sentence(pending.strip())
+            
+            return "".join(parts).strip()
             
         except Exception as e:
-            logger.error(f"Error generating AI response: {e}")
+            logger.error("Error generating AI response: %s", e)
             raise
     
-    def _manage_conversation_history(self) -> None:
-        """Manage conversation history to stay within limits"""
-        # Keep system message + recent exchanges
-        max_messages = (Config.MAX_CONVERSATION_HISTORY * 2) + 1  # user + assistant pairs + system
+    async def _embed(self, text: str) -> List[float]:
+        """Get the embedding vector for text (used by the semantic cache)"""
+        response = await self.client.embeddings.create(
+            model=Config.EMBEDDING_MODEL,
+            input=text
+        )
+        return response.data[0].embedding
+    
+    @staticmethod
+    def _load_encoding():
+        """Load the tokenizer for the configured model (None if tiktoken is unavailable)"""
+        if tiktoken is None:
+            logger.info("tiktoken not installed, estimating conversation token counts")
+            return None
+        try:
+            return tiktoken.encoding_for_model(Config.OPENAI_MODEL)
+        except Exception as e:
+            logger.warning("Could not load tokenizer for %s: %s", Config.OPENAI_MODEL, e)
+            return None
+    
+    def _count_tokens(self, text: str) -> int:
+        """Count the tokens a message adds to a request"""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text)) + 4  # Per-message overhead
+        return len(text) // 4 + 4
+    
+    def _append_message(self, message: Dict[str, str]) -> None:
+        """Add a message to the conversation history"""
+        if len(self._tail) == self._tail.maxlen:
+            # The oldest message (and its count) is evicted by the append below
+            self._tok_total -= self._tok_counts[0]
         
-        if len(self.conversation_history) > max_messages:
-            # Keep system message and most recent exchanges
-            system_msg = self.conversation_history[0]
-            recent_messages = self.conversation_history[-(max_messages-1):]
-            self.conversation_history = [system_msg] + recent_messages
-            logger.debug(f"Trimmed conversation history to {len(self.conversation_history)} messages")
+        count = self._count_tokens(message["content"])
+        self._tail.append(message)
+        self._tok_counts.append(count)
+        self._tok_total += count
+        
+        self._manage_conversation_history()
+    
+    def _discard_last_message(self, message: Dict[str, str]) -> None:
+        """Remove message from the end of the conversation history, if it is still there"""
+        if self._tail and self._tail[-1] is message:
+            self._tail.pop()
+            self._tok_total -= self._tok_counts.pop()
+    
+    def _manage_conversation_history(self) -> None:
+        """Drop the oldest messages until the history fits the token budget"""
+        while self._tok_total > Config.MAX_HISTORY_TOKENS and len(self._tail) > 1:
+            self._tail.popleft()
+            self._tok_total -= self._tok_counts.popleft()
+            logger.debug("Trimmed conversation history to %s tokens", self._tok_total)
     
     def _get_error_response(self) -> str:
         """Get a fallback response when AI processing fails"""
@@ -130,14 +335,14 @@ class AIBrain:
             "I seem to be experiencing some technical difficulties. Please give me a moment.",
             "I'm not quite sure how to respond to that. Could you rephrase your question?",
         ]
-        import random
-        return random.choice(error_responses)
+        return self._rng.choice(error_responses)
     
     def get_conversation_summary(self) -> Dict[str, any]:
         """Get a summary of the current conversation"""
         return {
-            "total_exchanges": (len(self.conversation_history) - 1) // 2,  # Exclude system message
-            "history_length": len(self.conversation_history),
+            "total_exchanges": len(self._tail) // 2,
+            "history_length": len(self._tail) + 1,  # Include system message
+            "history_tokens": self._tok_total,
             "ai_name": Config.AI_NAME,
             "model": Config.OPENAI_MODEL
         }
@@ -145,19 +350,39 @@ class AIBrain:
     def reset_conversation(self) -> None:
         """Reset the conversation history"""
         logger.info("Resetting conversation history")
-        self.conversation_history = []
+        self._tail.clear()
+        self._tok_counts.clear()
+        self._tok_total = 0
         self._initialize_conversation()
     
     def set_user_context(self, key: str, value: str) -> None:
         """Set user context information"""
         self.user_context[key] = value
-        logger.debug(f"Set user context: {key} = {value}")
+        logger.debug("Set user context: %s = %s", key, value)
     
     def get_user_context(self, key: str) -> Optional[str]:
         """Get user context information"""
         return self.user_context.get(key)
     
-    def analyze_intent(self, user_input: str) -> Dict[str, any]:
+    @staticmethod
+    def _parse_intent(content: str) -> Dict[str, any]:
+        """Decode the model's intent JSON, checking it has the expected fields and types"""
+        data = json.loads(content)
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+        
+        entities = data.get("entities", [])
+        if not isinstance(data.get("intent"), str) or not isinstance(entities, list):
+            raise ValueError(f"Malformed intent analysis: {data}")
+        
+        return {
+            "intent": data["intent"],
+            "confidence": float(data.get("confidence", 0.0)),
+            "entities": [str(entity) for entity in entities],
+            "requires_action": bool(data.get("requires_action", False))
+        }
+    
+    async def analyze_intent(self, user_input: str) -> Dict[str, any]:
         """
         Analyze user intent for better response handling
         
@@ -176,19 +401,19 @@ class AIBrain:
             
             User input: "{user_input}" """
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=Config.OPENAI_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 response_format={"type": "json_object"},
                 max_tokens=100
             )
             
-            result = json.loads(response.choices[0].message.content)
-            logger.debug(f"Intent analysis: {result}")
+            result = self._parse_intent(response.choices[0].message.content)
+            logger.debug("Intent analysis: %s", result)
             return result
             
         except Exception as e:
-            logger.error(f"Error analyzing intent: {e}")
+            logger.error("Error analyzing intent: %s", e)
             return {
                 "intent": "unknown",
                 "confidence": 0.0,
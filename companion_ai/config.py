@@ -2,6 +2,7 @@
 Configuration settings for the Companion AI
 """
 import os
+import re
 from typing import Optional
 
 class Config:
@@ -13,22 +14,45 @@ class Config:
     # OpenAI Configuration (only used if AI_MODE is "openai")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = "gpt-4o"  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+    OPENAI_TIMEOUT: float = 10.0  # Seconds to wait for a response
+    OPENAI_CONNECT_TIMEOUT: float = 3.0  # Seconds to wait for a connection
+    OPENAI_KEEPALIVE: float = 60.0  # Seconds to keep idle connections open
     
     # Voice Recognition Settings
     MICROPHONE_INDEX: Optional[int] = None  # Auto-detect by default
     ENERGY_THRESHOLD: int = 4000  # Adjust based on environment noise
     TIMEOUT: float = 1.0  # Seconds to wait for speech
     PHRASE_TIMEOUT: float = 0.3  # Seconds of silence to end phrase
+    NOISE_CALIBRATION_MAX_AGE: float = 6 * 3600  # Seconds a saved noise calibration stays valid
+    ASR_BACKEND: str = os.getenv("ASR_BACKEND", "google")  # "google", "vosk" or "whisper"
+    VOSK_MODEL_PATH: str = os.getenv("VOSK_MODEL_PATH", "model-small-en")  # Vosk model directory
+    WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "tiny.en")  # faster-whisper model name or path
+    VAD_BACKEND: str = os.getenv("VAD_BACKEND", "energy")  # "energy" or "webrtc" (needs webrtcvad)
+    VAD_AGGRESSIVENESS: int = 2  # WebRTC VAD filtering of non-speech (0 to 3)
     
     # Text-to-Speech Settings
+    TTS_BACKEND: str = os.getenv("TTS_BACKEND", "pyttsx3")  # "pyttsx3" or "piper" (needs aplay)
+    PIPER_MODEL_PATH: str = os.getenv("PIPER_MODEL_PATH", "en_US-amy-low.onnx")  # Piper ONNX voice
+    PIPER_CONFIG_PATH: Optional[str] = os.getenv("PIPER_CONFIG_PATH")  # Defaults to <model>.json
     TTS_RATE: int = 150  # Words per minute
     TTS_VOLUME: float = 0.9  # Volume level (0.0 to 1.0)
     TTS_VOICE_INDEX: int = 0  # Voice selection index
+    TTS_CACHE_SIZE: int = 64  # Number of rendered phrases to keep in memory
+    TTS_QUEUE_MAX: int = 16  # Queued phrases before the oldest is dropped
     
     # Conversation Settings
     MAX_CONVERSATION_HISTORY: int = 10  # Number of exchanges to remember
+    MAX_HISTORY_TOKENS: int = 3000  # Token budget for remembered messages (OpenAI mode)
     WAKE_WORDS: list = ["hey haro", "haro", "ai"]
     
+    # Response Cache Settings
+    CACHE_DIR: str = os.path.expanduser(os.getenv("HARO_CACHE_DIR", "~/.cache/haro"))
+    RESPONSE_CACHE_SIZE: int = 512  # Number of responses to keep
+    RESPONSE_CACHE_TTL: float = 24 * 3600  # Seconds a cached response stays valid
+    SEMANTIC_CACHE: bool = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"  # Requires numpy
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for a cache hit
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    
     # AI Personality Settings
     AI_NAME: str = "Haro"
     AI_PERSONALITY: str = """You are Haro, a helpful and friendly AI assistant. You are:
@@ -39,9 +63,21 @@ class Config:
     - Designed to be a loyal companion
     Keep responses concise but warm, as they will be spoken aloud."""
     
+    # Fixed phrases (pre-rendered by the speech engine at startup)
+    GREETING_MESSAGE: str = f"Hello! I'm {AI_NAME}, your AI assistant. How can I help you today?"
+    FAREWELL_MESSAGE: str = "Goodbye! It was nice talking with you."
+    ERROR_MESSAGE: str = "I'm sorry, I encountered an error processing your request."
+    
     # Hardware Settings (for future robot integration)
     ENABLE_GPIO: bool = False  # Set to True when running on actual Raspberry Pi
     
+    # Wake-word matcher compiled from WAKE_WORDS: case-insensitive whole-word
+    # matches, longest wake word first. Rebuild it if WAKE_WORDS changes.
+    WAKE_RE: "re.Pattern[str]" = re.compile(
+        r"\b(?:" + "|".join(map(re.escape, sorted(WAKE_WORDS, key=len, reverse=True))) + r")\b",
+        re.IGNORECASE
+    )
+    
     @classmethod
     def validate(cls) -> bool:
         """Validate configuration settings"""
@@ -54,6 +90,15 @@ class Config:
         else:
             print(f"Error: Invalid AI_MODE '{cls.AI_MODE}'. Use 'local' or 'openai'.")
             return False
+        if cls.ASR_BACKEND not in ("google", "vosk", "whisper"):
+            print(f"Error: Invalid ASR_BACKEND '{cls.ASR_BACKEND}'. Use 'google', 'vosk' or 'whisper'.")
+            return False
+        if cls.VAD_BACKEND not in ("energy", "webrtc"):
+            print(f"Error: Invalid VAD_BACKEND '{cls.VAD_BACKEND}'. Use 'energy' or 'webrtc'.")
+            return False
+        if cls.TTS_BACKEND not in ("pyttsx3", "piper"):
+            print(f"Error: Invalid TTS_BACKEND '{cls.TTS_BACKEND}'. Use 'pyttsx3' or 'piper'.")
+            return False
         return True
     
     @classmethod
@@ -64,6 +109,9 @@ class Config:
         print(f"AI Mode: {cls.AI_MODE} ({'FREE' if cls.AI_MODE == 'local' else 'API-based'})")
         if cls.AI_MODE == "openai":
             print(f"OpenAI Model: {cls.OPENAI_MODEL}")
+        print(f"Speech Recognition: {cls.ASR_BACKEND}")
+        print(f"Voice Detection: {cls.VAD_BACKEND}")
+        print(f"Text-to-Speech: {cls.TTS_BACKEND}")
         print(f"TTS Rate: {cls.TTS_RATE} WPM")
         print(f"Energy Threshold: {cls.ENERGY_THRESHOLD}")
         print(f"Max History: {cls.MAX_CONVERSATION_HISTORY}")
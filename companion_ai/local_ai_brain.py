@@ -2,127 +2,223 @@
 Local AI brain - handles conversation without external APIs
 Provides free, offline AI functionality with expandable knowledge base
 """
+import ast
+import functools
 import json
+import operator
+import os
 import random
 import re
+import sys
+from collections import ChainMap, deque
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import ChainMap as ChainMapType, Deque, Iterator, List, Dict, Optional, Any, Sequence, Tuple
 from .config import Config
-from .utils import logger
+from .utils import logger, normalize_text, split_sentences
+
+# Keyword groups for response selection, in priority order
+_RESPONSE_KEYWORDS = {
+    "greeting": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
+    "goodbye": ["goodbye", "bye", "see you", "farewell", "quit", "exit"],
+    "thanks": ["thank", "thanks", "appreciate"],
+    "time": ["time", "clock", "hour"],
+    "date": ["date", "day", "today", "calendar"],
+    "weather": ["weather", "temperature", "rain", "raining", "sunny", "cloudy"],
+    "math": ["calculate", "math", "plus", "minus", "multiply", "multiplied", "divide", "divided", "+", "-", "*", "/", "times"],
+    "robot": ["robot", "robots", "move", "walk", "drive"],
+    "capabilities": ["can you", "what can", "help", "do", "abilities", "capabilities"],
+    "personal": ["who are you", "what are you", "tell me about yourself", "introduce yourself"],
+}
+
+# Intent classes as (intent, confidence, keywords), in priority order
+_INTENT_CLASSES = (
+    ("greeting", 0.9, frozenset({"hello", "hi", "hey"})),
+    ("goodbye", 0.9, frozenset({"goodbye", "bye"})),
+    ("time_query", 0.8, frozenset({"time", "clock"})),
+    ("date_query", 0.8, frozenset({"date", "today"})),
+    ("calculation", 0.7, frozenset({"calculate", "math", "+", "-", "*", "/"})),
+    ("weather_query", 0.8, frozenset({"weather"})),
+)
+_MATH_SYMBOLS = frozenset("+-*/")
+
+def _compile_keywords(groups: Dict[str, List[str]]) -> "re.Pattern[str]":
+    """Compile keyword groups into a single regex with one named group per key"""
+    def pattern(word: str) -> str:
+        escaped = re.escape(word)
+        return rf"\b{escaped}\b" if word[0].isalnum() else escaped
+    
+    return re.compile(
+        "|".join(f"(?P<{name}>{'|'.join(map(pattern, words))})" for name, words in groups.items())
+    )
+
+def _match_keywords(regex: "re.Pattern[str]", text: str) -> Optional[str]:
+    """Return the highest-priority keyword group found in normalized text, if any"""
+    matched = {match.lastgroup for match in regex.finditer(text)}
+    if not matched:
+        return None
+    return next(name for name in regex.groupindex if name in matched)
+
+_RESPONSE_RE = _compile_keywords(_RESPONSE_KEYWORDS)
+
+# Spoken operators rewritten to symbols before extracting an expression
+_MATH_WORDS = {
+    "plus": "+",
+    "minus": "-",
+    "times": "*",
+    "multiplied by": "*",
+    "divided by": "/",
+}
+_MATH_WORDS_RE = re.compile(r"\b(?:" + "|".join(_MATH_WORDS) + r")\b", re.IGNORECASE)
+
+# Arithmetic allowed in math expressions
+_MATH_RE = re.compile(r'[\d\.\+\-\*/\(\)\s]+')
+_MATH_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+_MAX_EXPONENT = 100
+_MAX_RESULT_BITS = 4096  # Largest integer result, keeps nested powers from exhausting memory
+
+@functools.lru_cache(maxsize=256)
+def _parse_math(expression: str) -> ast.expr:
+    """Parse a math expression (cached by expression string)"""
+    return ast.parse(expression, mode="eval").body
+
+def _safe_eval(node: ast.expr) -> float:
+    """Evaluate a parsed arithmetic expression, rejecting anything else"""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _MATH_OPERATORS:
+        left = _safe_eval(node.left)
+        right = _safe_eval(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > _MAX_EXPONENT:
+                raise ValueError(f"Exponent too large: {right}")
+            if isinstance(left, int) and isinstance(right, int) and abs(left).bit_length() * right > _MAX_RESULT_BITS:
+                raise ValueError("Result too large")
+        result = _MATH_OPERATORS[type(node.op)](left, right)
+        if isinstance(result, int) and result.bit_length() > _MAX_RESULT_BITS:
+            raise ValueError("Result too large")
+        return result
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _MATH_OPERATORS:
+        return _MATH_OPERATORS[type(node.op)](_safe_eval(node.operand))
+    raise ValueError(f"Unsupported expression: {ast.dump(node)}")
+
+def _intern_all(*responses: str) -> Tuple[str, ...]:
+    """Intern response strings so every brain shares one copy"""
+    return tuple(map(sys.intern, responses))
+
+# Response patterns for different types of conversations
+_RESPONSE_PATTERNS = {
+    "greeting": _intern_all(
+        "Hello! Great to see you again!",
+        "Hi there! How can I help you today?",
+        "Hey! What's on your mind?",
+        "Good to see you! What would you like to talk about?",
+    ),
+    "goodbye": _intern_all(
+        "Goodbye! It was great talking with you!",
+        "See you later! Have a wonderful day!",
+        "Take care! I'll be here when you need me.",
+        "Until next time! Stay safe!",
+    ),
+    "thanks": _intern_all(
+        "You're very welcome!",
+        "Happy to help!",
+        "My pleasure!",
+        "Anytime! That's what I'm here for.",
+    ),
+    "unknown": _intern_all(
+        "That's an interesting question! I'm still learning about that topic.",
+        "I don't have specific information about that right now, but I'd love to help in other ways!",
+        "Hmm, that's not in my current knowledge base. Is there something else I can help you with?",
+        "I'm not sure about that particular topic, but I'm always eager to learn! What else can I assist you with?",
+    ),
+    "conversation": _intern_all(
+        "Tell me more about that!",
+        "That sounds interesting! What else?",
+        "I'd love to hear more about your thoughts on that.",
+        "That's fascinating! Can you share more details?",
+    ),
+}
+
+# Default knowledge base content, edit data/kb.json to expand it
+_KB_PATH = os.path.join(os.path.dirname(__file__), "data", "kb.json")
+
+with open(_KB_PATH, "rb") as _kb_file:
+    _KB_DATA: Dict[str, Any] = json.loads(_kb_file.read())
+
+# Canned responses for knowledge base topics (only _TEMPLATE_TOPICS are templates, see _render_response)
+_TOPIC_RESPONSES = {
+    topic: _intern_all(*entry["responses"]) for topic, entry in _KB_DATA["topics"].items()
+}
+
+# Topics whose responses are templates filled in with the current time, all others are plain text
+_TEMPLATE_TOPICS = frozenset({"time", "date"})
+
+# Responses for each keyword group in _RESPONSE_KEYWORDS
+_BRANCH_RESPONSES = {
+    "greeting": _RESPONSE_PATTERNS["greeting"],
+    "goodbye": _RESPONSE_PATTERNS["goodbye"],
+    "thanks": _RESPONSE_PATTERNS["thanks"],
+    "time": _TOPIC_RESPONSES["time"],
+    "date": _TOPIC_RESPONSES["date"],
+    "weather": _TOPIC_RESPONSES["weather"],
+    "robot": _TOPIC_RESPONSES["robot"],
+    "capabilities": _TOPIC_RESPONSES["capabilities"],
+}
 
 class LocalAIBrain:
     """Local AI brain that works completely offline"""
     
+    __slots__ = ("_system_msg", "_tail", "user_context", "response_patterns", "_recent_choices", "_rng", "knowledge_base")
+    
+    # Built once and shared by every instance, see _get_knowledge_base
+    _default_knowledge_base: Optional[Dict[str, Any]] = None
+    
     def __init__(self):
         """Initialize the local AI brain"""
-        self.conversation_history: List[Dict[str, str]] = []
+        self._system_msg: Dict[str, str] = {}
+        self._tail: Deque[Dict[str, str]] = deque(maxlen=Config.MAX_CONVERSATION_HISTORY * 2)
         self.user_context: Dict[str, Any] = {}
-        self.knowledge_base: Dict[str, Any] = {}
-        self.response_patterns: Dict[str, List[str]] = {}
+        self.response_patterns: Dict[str, Tuple[str, ...]] = _RESPONSE_PATTERNS
+        self._recent_choices: Dict[str, Deque[int]] = {}
+        self._rng = random.Random()
+        
+        # Shared default knowledge base, with a private overlay for add_knowledge
+        self.knowledge_base: ChainMapType[str, Any] = ChainMap({"custom": {}}, type(self)._get_knowledge_base())
         
-        self._load_knowledge_base()
-        self._load_response_patterns()
         self._initialize_conversation()
     
-    def _load_knowledge_base(self) -> None:
-        """Load the local knowledge base"""
-        # Default knowledge base - you can expand this
-        self.knowledge_base = {
-            "personal_info": {
-                "name": Config.AI_NAME,
-                "purpose": "I'm your personal AI assistant designed to help with daily tasks",
-                "capabilities": [
-                    "Answer questions about various topics",
-                    "Help with calculations and conversions", 
-                    "Provide weather information (when connected)",
-                    "Assist with scheduling and reminders",
-                    "Control smart home devices (when configured)",
-                    "Engage in friendly conversation"
-                ]
-            },
+    @classmethod
+    def _get_knowledge_base(cls) -> Dict[str, Any]:
+        """Get the default knowledge base, building it on first use"""
+        if cls._default_knowledge_base is None:
+            cls._default_knowledge_base = cls._build_knowledge_base()
+            logger.info("Local knowledge base loaded successfully")
+        return cls._default_knowledge_base
+    
+    @staticmethod
+    def _build_knowledge_base() -> Dict[str, Any]:
+        """Build the default knowledge base"""
+        return {
+            "personal_info": {"name": Config.AI_NAME, **_KB_DATA["personal_info"]},
             "topics": {
-                "weather": {
-                    "responses": [
-                        "I'd love to help with weather information, but I need internet connectivity for current conditions.",
-                        "For accurate weather data, I'd need to connect to a weather service."
-                    ]
-                },
-                "time": {
-                    "responses": [
-                        f"The current time is {datetime.now().strftime('%H:%M %p')}",
-                        f"It's {datetime.now().strftime('%I:%M %p')} right now"
-                    ]
-                },
-                "date": {
-                    "responses": [
-                        f"Today is {datetime.now().strftime('%A, %B %d, %Y')}",
-                        f"The date is {datetime.now().strftime('%m/%d/%Y')}"
-                    ]
-                },
-                "math": {
-                    "responses": [
-                        "I can help with basic calculations. What would you like me to calculate?",
-                        "I'm good with math! What calculation do you need?"
-                    ]
-                },
-                "robot": {
-                    "responses": [
-                        "I'm designed to be part of a robot companion! Right now I can talk, but in the future I could move around and interact with the physical world.",
-                        "My robot capabilities are currently in development. For now, I focus on being a great conversational companion!"
-                    ]
-                },
-                "capabilities": {
-                    "responses": [
-                        "I can have conversations, answer questions, help with basic calculations, tell you the time and date, and much more! What would you like help with?",
-                        "My main skills include conversation, basic information lookup, time/date queries, and being a friendly companion. How can I assist you today?"
-                    ]
-                }
+                topic: {"responses": responses} for topic, responses in _TOPIC_RESPONSES.items()
             },
-            "facts": {
-                "raspberry_pi": "I'm running on a Raspberry Pi, which is a small but powerful computer perfect for robotics and AI projects!",
-                "open_source": "I'm built with open-source technologies and can work completely offline for privacy and independence.",
-                "expandable": "My knowledge base can be easily expanded by adding new topics and responses to my configuration files."
-            }
+            "facts": _KB_DATA["facts"]
         }
-        
-        logger.info("Local knowledge base loaded successfully")
     
-    def _load_response_patterns(self) -> None:
-        """Load response patterns for different types of conversations"""
-        self.response_patterns = {
-            "greeting": [
-                "Hello! Great to see you again!",
-                "Hi there! How can I help you today?",
-                "Hey! What's on your mind?",
-                "Good to see you! What would you like to talk about?"
-            ],
-            "goodbye": [
-                "Goodbye! It was great talking with you!",
-                "See you later! Have a wonderful day!",
-                "Take care! I'll be here when you need me.",
-                "Until next time! Stay safe!"
-            ],
-            "thanks": [
-                "You're very welcome!",
-                "Happy to help!",
-                "My pleasure!",
-                "Anytime! That's what I'm here for."
-            ],
-            "unknown": [
-                "That's an interesting question! I'm still learning about that topic.",
-                "I don't have specific information about that right now, but I'd love to help in other ways!",
-                "Hmm, that's not in my current knowledge base. Is there something else I can help you with?",
-                "I'm not sure about that particular topic, but I'm always eager to learn! What else can I assist you with?"
-            ],
-            "conversation": [
-                "Tell me more about that!",
-                "That sounds interesting! What else?",
-                "I'd love to hear more about your thoughts on that.",
-                "That's fascinating! Can you share more details?"
-            ]
-        }
-        
-        logger.info("Response patterns loaded successfully")
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """System message followed by the recent conversation"""
+        return [self._system_msg, *self._tail]
     
     def _initialize_conversation(self) -> None:
         """Initialize conversation with system context"""
@@ -130,7 +226,7 @@ class LocalAIBrain:
             "role": "system",
             "content": f"You are {Config.AI_NAME}, a helpful AI assistant running locally."
         }
-        self.conversation_history.append(system_message)
+        self._system_msg = system_message
         logger.info("Local conversation initialized")
     
     def process_input(self, user_input: str) -> str:
@@ -144,113 +240,105 @@ class LocalAIBrain:
             AI response text
         """
         try:
-            logger.info(f"Processing user input: '{user_input}'")
+            logger.info("Processing user input: '%s'", user_input)
             
             # Add user message to conversation history
             user_message = {"role": "user", "content": user_input}
-            self.conversation_history.append(user_message)
+            self._tail.append(user_message)
             
             # Analyze input and generate response
             response = self._generate_local_response(user_input)
             
             # Add AI response to conversation history
             ai_message = {"role": "assistant", "content": response}
-            self.conversation_history.append(ai_message)
-            
-            # Manage conversation history size
-            self._manage_conversation_history()
+            self._tail.append(ai_message)
             
-            logger.info(f"Generated response: '{response}'")
+            logger.info("Generated response: '%s'", response)
             return response
             
         except Exception as e:
-            logger.error(f"Error processing input: {e}")
+            logger.error("Error processing input: %s", e)
             return self._get_error_response()
     
+    def stream_input(self, user_input: str) -> Iterator[str]:
+        """
+        Process user input, yielding the response sentence by sentence
+        
+        Args:
+            user_input: The user's spoken input
+            
+        Yields:
+            AI response sentences
+        """
+        for sentence in split_sentences(self.process_input(user_input)):
+            if sentence:
+                yield sentence
+    
     def _generate_local_response(self, user_input: str) -> str:
         """Generate response using local knowledge and patterns"""
-        user_input_lower = user_input.lower().strip()
-        
-        # Check for specific patterns first
-        
-        # Greetings
-        if any(word in user_input_lower for word in ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"]):
-            return random.choice(self.response_patterns["greeting"])
-        
-        # Goodbyes
-        if any(word in user_input_lower for word in ["goodbye", "bye", "see you", "farewell", "quit", "exit"]):
-            return random.choice(self.response_patterns["goodbye"])
-        
-        # Thanks
-        if any(word in user_input_lower for word in ["thank", "thanks", "appreciate"]):
-            return random.choice(self.response_patterns["thanks"])
-        
-        # Time queries
-        if any(word in user_input_lower for word in ["time", "clock", "hour"]):
-            return random.choice(self.knowledge_base["topics"]["time"]["responses"])
-        
-        # Date queries  
-        if any(word in user_input_lower for word in ["date", "day", "today", "calendar"]):
-            return random.choice(self.knowledge_base["topics"]["date"]["responses"])
+        branch = _match_keywords(_RESPONSE_RE, normalize_text(user_input))
         
-        # Weather queries
-        if any(word in user_input_lower for word in ["weather", "temperature", "rain", "sunny", "cloudy"]):
-            return random.choice(self.knowledge_base["topics"]["weather"]["responses"])
-        
-        # Math/calculations
-        if any(word in user_input_lower for word in ["calculate", "math", "plus", "minus", "multiply", "divide", "+", "-", "*", "/", "times"]):
-            return self._handle_math(user_input)
-        
-        # Robot/capabilities questions
-        if any(word in user_input_lower for word in ["robot", "move", "walk", "drive"]):
-            return random.choice(self.knowledge_base["topics"]["robot"]["responses"])
-        
-        # Capability questions
-        if any(word in user_input_lower for word in ["can you", "what can", "help", "do", "abilities", "capabilities"]):
-            return random.choice(self.knowledge_base["topics"]["capabilities"]["responses"])
-        
-        # Personal questions about the AI
-        if any(word in user_input_lower for word in ["who are you", "what are you", "tell me about yourself", "introduce yourself"]):
-            return f"I'm {Config.AI_NAME}, {self.knowledge_base['personal_info']['purpose']}. I can help you with many things like answering questions, basic calculations, and friendly conversation!"
+        match branch:
+            # Math/calculations
+            case "math":
+                return self._handle_math(user_input)
+            
+            # Personal questions about the AI
+            case "personal":
+                return f"I'm {Config.AI_NAME}, {self.knowledge_base['personal_info']['purpose']}. I can help you with many things like answering questions, basic calculations, and friendly conversation!"
+            
+            # Time/date templates need the current time
+            case "time" | "date":
+                return self._render_response(self._choose(branch, _BRANCH_RESPONSES[branch]))
+            
+            # Default conversational response
+            case None:
+                return self._choose("unknown", self.response_patterns["unknown"])
+            
+            # Canned responses
+            case _:
+                return self._choose(branch, _BRANCH_RESPONSES[branch])
+    
+    def _choose(self, branch: str, responses: Sequence[str]) -> str:
+        """Pick a response for a branch, avoiding the ones used most recently"""
+        recent = self._recent_choices.get(branch)
+        if recent is None:
+            recent = self._recent_choices[branch] = deque(maxlen=min(len(responses) - 1, 2))
         
-        # Default conversational response
-        return random.choice(self.response_patterns["unknown"])
+        index = self._rng.choice([i for i in range(len(responses)) if i not in recent])
+        recent.append(index)
+        return responses[index]
+    
+    @staticmethod
+    def _render_response(template: str) -> str:
+        """Fill in a response template that refers to the current time"""
+        return template.format(now=datetime.now())
     
     def _handle_math(self, user_input: str) -> str:
         """Handle basic math calculations"""
         try:
-            # Extract numbers and basic operators
-            math_pattern = r'([\d\.\+\-\*/\(\)\s]+)'
-            match = re.search(math_pattern, user_input)
+            # Extract the first run of numbers and basic operators
+            text = _MATH_WORDS_RE.sub(lambda m: f" {_MATH_WORDS[m.group().lower()]} ", user_input)
+            expression = next(
+                (match.strip() for match in _MATH_RE.findall(text) if any(c.isdigit() for c in match)),
+                None
+            )
             
-            if match:
-                expression = match.group(1).strip()
-                # Only allow safe math operations
-                allowed_chars = set('0123456789+-*/.() ')
-                if all(c in allowed_chars for c in expression):
-                    try:
-                        result = eval(expression)
-                        return f"The answer is {result}"
-                    except:
-                        pass
+            # A lone number is not a calculation
+            if expression and any(c in "+-*/" for c in expression.lstrip("+-")):
+                # Only arithmetic nodes are evaluated, everything else is rejected
+                try:
+                    result = _safe_eval(_parse_math(expression))
+                    return f"The answer is {result}"
+                except (SyntaxError, ValueError, ArithmeticError, RecursionError):
+                    pass
             
             return "I can help with basic math! Try asking me something like 'what is 15 plus 7' or '10 times 3'"
             
         except Exception as e:
-            logger.error(f"Error in math handling: {e}")
+            logger.error("Error in math handling: %s", e)
             return "I had trouble with that calculation. Could you rephrase it?"
     
-    def _manage_conversation_history(self) -> None:
-        """Manage conversation history to stay within limits"""
-        max_messages = (Config.MAX_CONVERSATION_HISTORY * 2) + 1
-        
-        if len(self.conversation_history) > max_messages:
-            # Keep system message and recent exchanges
-            system_msg = self.conversation_history[0]
-            recent_messages = self.conversation_history[-(max_messages-1):]
-            self.conversation_history = [system_msg] + recent_messages
-            logger.debug(f"Trimmed conversation history to {len(self.conversation_history)} messages")
-    
     def _get_error_response(self) -> str:
         """Get a fallback response when processing fails"""
         error_responses = [
@@ -258,13 +346,13 @@ class LocalAIBrain:
             "I seem to be experiencing some technical difficulties. Please give me a moment.",
             "I'm not quite sure how to respond to that. Could you rephrase your question?",
         ]
-        return random.choice(error_responses)
+        return self._rng.choice(error_responses)
     
     def get_conversation_summary(self) -> Dict[str, Any]:
         """Get a summary of the current conversation"""
         return {
-            "total_exchanges": (len(self.conversation_history) - 1) // 2,
-            "history_length": len(self.conversation_history),
+            "total_exchanges": len(self._tail) // 2,
+            "history_length": len(self._tail) + 1,  # Include system message
             "ai_name": Config.AI_NAME,
             "model": "Local Knowledge Base",
             "mode": "offline"
@@ -273,13 +361,13 @@ class LocalAIBrain:
     def reset_conversation(self) -> None:
         """Reset the conversation history"""
         logger.info("Resetting conversation history")
-        self.conversation_history = []
+        self._tail.clear()
         self._initialize_conversation()
     
     def set_user_context(self, key: str, value: str) -> None:
         """Set user context information"""
         self.user_context[key] = value
-        logger.debug(f"Set user context: {key} = {value}")
+        logger.debug("Set user context: %s = %s", key, value)
     
     def get_user_context(self, key: str) -> Optional[str]:
         """Get user context information"""
@@ -295,33 +383,20 @@ class LocalAIBrain:
         Returns:
             Dictionary with intent analysis
         """
-        user_input_lower = user_input.lower()
+        # Simple intent classification on whole words (plus any math symbols)
+        tokens = frozenset(normalize_text(user_input).split())
+        tokens |= _MATH_SYMBOLS.intersection(user_input)
         
-        # Simple intent classification
-        if any(word in user_input_lower for word in ["hello", "hi", "hey"]):
-            intent = "greeting"
-            confidence = 0.9
-        elif any(word in user_input_lower for word in ["goodbye", "bye"]):
-            intent = "goodbye" 
-            confidence = 0.9
-        elif any(word in user_input_lower for word in ["time", "clock"]):
-            intent = "time_query"
-            confidence = 0.8
-        elif any(word in user_input_lower for word in ["date", "today"]):
-            intent = "date_query"
-            confidence = 0.8
-        elif any(word in user_input_lower for word in ["calculate", "math", "+", "-", "*", "/"]):
-            intent = "calculation"
-            confidence = 0.7
-        elif any(word in user_input_lower for word in ["weather"]):
-            intent = "weather_query"
-            confidence = 0.8
-        elif "?" in user_input:
-            intent = "question"
-            confidence = 0.6
+        for intent, confidence, keywords in _INTENT_CLASSES:
+            if tokens & keywords:
+                break
         else:
-            intent = "casual_chat"
-            confidence = 0.5
+            if "?" in user_input:
+                intent = "question"
+                confidence = 0.6
+            else:
+                intent = "casual_chat"
+                confidence = 0.5
         
         return {
             "intent": intent,
@@ -331,23 +406,23 @@ class LocalAIBrain:
         }
     
     def add_knowledge(self, topic: str, information: str) -> None:
-        """Add new knowledge to the knowledge base"""
-        if "custom" not in self.knowledge_base:
-            self.knowledge_base["custom"] = {}
-        
+        """Add new knowledge to this brain's private knowledge overlay"""
         self.knowledge_base["custom"][topic] = information
-        logger.info(f"Added knowledge for topic: {topic}")
+        logger.info("Added knowledge for topic: %s", topic)
     
     def get_knowledge(self, topic: str) -> Optional[str]:
         """Retrieve knowledge about a specific topic"""
         # Check custom knowledge first
-        if "custom" in self.knowledge_base and topic in self.knowledge_base["custom"]:
+        if topic in self.knowledge_base["custom"]:
             return self.knowledge_base["custom"][topic]
         
         # Check built-in knowledge
         if topic in self.knowledge_base.get("topics", {}):
             responses = self.knowledge_base["topics"][topic].get("responses", [])
-            return random.choice(responses) if responses else None
+            if not responses:
+                return None
+            response = self._rng.choice(responses)
+            return self._render_response(response) if topic in _TEMPLATE_TOPICS else response
         
         if topic in self.knowledge_base.get("facts", {}):
             return self.knowledge_base["facts"][topic]
@@ -3,32 +3,20 @@ Main application entry point for Companion AI
 """
 import sys
 import signal
-import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-try:
-    from .config import Config
-    from .voice_handler import VoiceHandler
-    from .speech_engine import SpeechEngine
-    from .ai_brain import AIBrain
-    from .local_ai_brain import LocalAIBrain
-    from .utils import (
-        logger, print_banner, print_status, 
-        validate_audio_setup, get_system_info, 
-        check_raspberry_pi, PerformanceMonitor
-    )
-except ImportError:
-    from config import Config
-    from voice_handler import VoiceHandler
-    from speech_engine import SpeechEngine
-    from ai_brain import AIBrain
-    from local_ai_brain import LocalAIBrain
-    from utils import (
-        logger, print_banner, print_status, 
-        validate_audio_setup, get_system_info, 
-        check_raspberry_pi, PerformanceMonitor
-    )
+from .config import Config
+from .voice_handler import VoiceHandler
+from .speech_engine import SpeechEngine
+from .ai_brain import AIBrain
+from .local_ai_brain import LocalAIBrain
+from .utils import (
+    logger, print_banner, print_status, 
+    validate_audio_setup, get_system_info, 
+    check_raspberry_pi, PerformanceMonitor
+)
 
 class HaroAI:
     """Main Haro AI application class"""
@@ -40,6 +28,7 @@ class HaroAI:
         self.ai_brain: Optional[AIBrain] = None
         self.is_running = False
         self.performance_monitor = PerformanceMonitor()
+        self._shutdown_event = threading.Event()
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -47,9 +36,12 @@ class HaroAI:
     
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals"""
-        logger.info(f"Received signal {signum}, shutting down gracefully...")
-        self.shutdown()
-        sys.exit(0)
+        logger.info("Received signal %s, shutting down gracefully...", signum)
+        self._shutdown_event.set()
+        
+        # Outside the main loop (startup, test mode) nothing waits on the event
+        if not self.is_running:
+            sys.exit(0)
     
     def initialize(self) -> bool:
         """Initialize all system components"""
@@ -74,22 +66,29 @@ class HaroAI:
             # Initialize components based on AI mode
             if Config.AI_MODE == "local":
                 print_status("Initializing local AI brain (FREE mode)...", "INFO")
-                self.ai_brain = LocalAIBrain()
+                brain_class = LocalAIBrain
             else:
                 print_status("Initializing OpenAI brain...", "INFO")
-                self.ai_brain = AIBrain()
+                brain_class = AIBrain
             
             print_status("Initializing speech engine...", "INFO")
-            self.speech_engine = SpeechEngine()
-            
             print_status("Initializing voice handler...", "INFO")
-            self.voice_handler = VoiceHandler(self._on_speech_detected)
+            
+            # The components are independent, so build them concurrently
+            with ThreadPoolExecutor(max_workers=3, thread_name_prefix="init") as executor:
+                brain_future = executor.submit(brain_class)
+                speech_future = executor.submit(SpeechEngine)
+                voice_future = executor.submit(VoiceHandler, self._on_speech_detected)
+                
+                self.ai_brain = brain_future.result()
+                self.speech_engine = speech_future.result()
+                self.voice_handler = voice_future.result()
             
             print_status("Initialization complete!", "SUCCESS")
             return True
             
         except Exception as e:
-            logger.error(f"Initialization failed: {e}")
+            logger.error("Initialization failed: %s", e)
             print_status(f"Initialization failed: {e}", "ERROR")
             return False
     
@@ -117,22 +116,19 @@ class HaroAI:
             
             print_status(f"You said: '{text}'", "LISTENING")
             
-            # Process input with AI brain
+            # Process input with AI brain, speaking each sentence as soon as it is ready
             print_status("Thinking...", "THINKING")
-            response = self.ai_brain.process_input(text)
-            
-            # Speak the response
-            print_status(f"Response: '{response}'", "SPEAKING")
-            self.speech_engine.speak(response)
+            for sentence in self.ai_brain.stream_input(text):
+                print_status(f"Response: '{sentence}'", "SPEAKING")
+                self.speech_engine.speak(sentence)
             
             # Log performance
             duration = self.performance_monitor.stop("response_time")
-            logger.debug(f"Response generated in {duration:.2f}s")
+            logger.debug("Response generated in %.2fs", duration)
             
         except Exception as e:
-            logger.error(f"Error processing speech: {e}")
-            error_msg = "I'm sorry, I encountered an error processing your request."
-            self.speech_engine.speak(error_msg)
+            logger.error("Error processing speech: %s", e)
+            self.speech_engine.speak(Config.ERROR_MESSAGE)
     
     def start(self):
         """Start the Haro AI system"""
@@ -143,7 +139,7 @@ class HaroAI:
             self.is_running = True
             
             # Greet the user
-            greeting = f"Hello! I'm {Config.AI_NAME}, your AI assistant. How can I help you today?"
+            greeting = Config.GREETING_MESSAGE
             print_status(greeting, "SPEAKING")
             self.speech_engine.speak(greeting)
             
@@ -158,7 +154,7 @@ class HaroAI:
             self._main_loop()
             
         except Exception as e:
-            logger.error(f"Error starting Haro AI: {e}")
+            logger.error("Error starting Haro AI: %s", e)
             return False
         
         return True
@@ -166,15 +162,13 @@ class HaroAI:
     def _main_loop(self):
         """Main application loop"""
         try:
-            while self.is_running:
-                time.sleep(1)
-                
-                # Optional: Add periodic health checks here
-                
+            # Sleep until shutdown() or a signal sets the event
+            self._shutdown_event.wait()
+            
         except KeyboardInterrupt:
             logger.info("Received keyboard interrupt")
         except Exception as e:
-            logger.error(f"Error in main loop: {e}")
+            logger.error("Error in main loop: %s", e)
         finally:
             self.shutdown()
     
@@ -185,6 +179,7 @@ class HaroAI:
         
         print_status("Shutting down Haro AI...", "INFO")
         self.is_running = False
+        self._shutdown_event.set()
         
         try:
             # Stop voice recognition
@@ -193,7 +188,7 @@ class HaroAI:
             
             # Farewell message
             if self.speech_engine:
-                farewell = "Goodbye! It was nice talking with you."
+                farewell = Config.FAREWELL_MESSAGE
                 self.speech_engine.speak_immediately(farewell)
                 self.speech_engine.wait_until_done(timeout=3)
                 self.speech_engine.shutdown()
@@ -201,7 +196,7 @@ class HaroAI:
             print_status("Shutdown complete", "SUCCESS")
             
         except Exception as e:
-            logger.error(f"Error during shutdown: {e}")
+            logger.error("Error during shutdown: %s", e)
     
     def test_mode(self):
         """Run in test mode for debugging"""
@@ -276,7 +271,7 @@ def main():
             sys.exit(1)
             
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
+        logger.error("Fatal error: %s", e)
         sys.exit(1)
 
 if __name__ == "__main__":
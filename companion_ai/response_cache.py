@@ -0,0 +1,198 @@
+"""
+Response cache for the Companion AI - skips repeat OpenAI round-trips
+"""
+import array
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from .utils import logger, normalize_text
+
+class ResponseCache:
+    """Two-tier (exact + optional semantic) LRU cache of AI responses"""
+    
+    def __init__(self, max_size: int = 512, path: Optional[str] = None, similarity_threshold: float = 0.92,
+                 ttl: float = 86400.0, semantic: bool = False):
+        """
+        Initialize the response cache
+        
+        Args:
+            max_size: Maximum number of cached responses
+            path: SQLite file used to keep the cache warm across restarts
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+            ttl: Seconds a cached response stays valid
+            semantic: Enable similarity lookups (needs numpy)
+        """
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._embeddings: Dict[bytes, List[float]] = {}
+        self._matrix = None
+        self._matrix_keys: List[bytes] = []
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._np = None
+        
+        if semantic:
+            try:
+                import numpy
+                self._np = numpy
+            except ImportError:
+                logger.warning("numpy is not installed, semantic response cache disabled")
+        
+        if path:
+            self._open_db(path)
+    
+    @property
+    def semantic(self) -> bool:
+        """Whether similarity lookups are available"""
+        return self._np is not None
+    
+    @staticmethod
+    def make_key(prompt: str, user_input: str, context: str = "") -> bytes:
+        """
+        Build a cache key from the system prompt, the previous reply and normalized user input
+        
+        Args:
+            prompt: System prompt
+            user_input: The user's input
+            context: The assistant message the user is replying to, empty at the start of a conversation
+        """
+        prompt_hash = hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+        normalized = " ".join(normalize_text(user_input).split())
+        return hashlib.blake2b(f"{context}\0{normalized}".encode(), digest_size=16, key=prompt_hash).digest()
+    
+    def _open_db(self, path: str) -> None:
+        """Open the persistent store and load the most recent entries"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key BLOB PRIMARY KEY, response TEXT, embedding BLOB, last_used REAL)"
+            )
+            cutoff = time.time() - self.ttl
+            self._db.execute("DELETE FROM responses WHERE last_used < ?", (cutoff,))
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, response, embedding, last_used FROM responses ORDER BY last_used DESC LIMIT ?",
+                (self.max_size,)
+            ).fetchall()
+            for key, response, embedding, stored_at in reversed(rows):
+                self._entries[key] = (response, stored_at)
+                if embedding is not None:
+                    self._embeddings[key] = self._decode_embedding(embedding)
+            logger.info("Response cache loaded with %s entries", len(self._entries))
+        except sqlite3.Error as e:
+            logger.error("Failed to open response cache: %s", e)
+            self._db = None
+    
+    def get(self, key: bytes) -> Optional[str]:
+        """Get an exact-match cached response"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expire(key, entry):
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def find_similar(self, embedding: List[float]) -> Optional[str]:
+        """Get the cached response whose input embedding is most similar"""
+        np = self._np
+        
+        with self._lock:
+            if np is None or not self._embeddings:
+                return None
+            
+            if self._matrix is None:
+                self._matrix_keys = list(self._embeddings)
+                self._matrix = np.array([self._embeddings[k] for k in self._matrix_keys], dtype=np.float32)
+                self._matrix /= np.linalg.norm(self._matrix, axis=1, keepdims=True)
+            
+            query = np.asarray(embedding, dtype=np.float32)
+            scores = self._matrix @ (query / np.linalg.norm(query))
+            best = int(scores.argmax())
+            if scores[best] < self.similarity_threshold:
+                return None
+            
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            if self._expire(key, entry):
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def _expire(self, key: bytes, entry: Tuple[str, float]) -> bool:
+        """Drop the entry if it is older than the TTL (lock must be held)"""
+        if time.time() - entry[1] < self.ttl:
+            return False
+        
+        del self._entries[key]
+        if self._embeddings.pop(key, None) is not None:
+            self._matrix = None
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error("Failed to remove expired response: %s", e)
+        return True
+    
+    def put(self, key: bytes, response: str, embedding: Optional[List[float]] = None) -> None:
+        """Add a response to the cache, evicting the least recently used entry"""
+        with self._lock:
+            now = time.time()
+            self._entries[key] = (response, now)
+            self._entries.move_to_end(key)
+            if embedding is not None:
+                self._embeddings[key] = embedding
+                self._matrix = None
+            
+            evicted = []
+            while len(self._entries) > self.max_size:
+                old_key, _ = self._entries.popitem(last=False)
+                if self._embeddings.pop(old_key, None) is not None:
+                    self._matrix = None
+                evicted.append(old_key)
+            
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                        (key, response, self._encode_embedding(embedding), now)
+                    )
+                    self._db.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in evicted])
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error("Failed to persist cached response: %s", e)
+    
+    def clear(self) -> None:
+        """Remove all cached responses"""
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+            self._matrix = None
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def _encode_embedding(embedding: Optional[List[float]]) -> Optional[bytes]:
+        """Pack an embedding as float32 bytes for storage"""
+        if embedding is None:
+            return None
+        return array.array("f", embedding).tobytes()
+    
+    @staticmethod
+    def _decode_embedding(data: bytes) -> List[float]:
+        """Unpack float32 bytes into an embedding"""
+        values = array.array("f")
+        values.frombytes(data)
+        return values.tolist()
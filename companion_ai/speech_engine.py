@@ -1,16 +1,40 @@
 """
 Text-to-speech engine for the Companion AI
 """
+import asyncio
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import pyttsx3
 import threading
-from queue import Queue
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional
-try:
-    from .config import Config
-    from .utils import logger
-except ImportError:
-    from config import Config
-    from utils import logger
+from .config import Config
+from .utils import get_event_loop, logger, run_coroutine
+
+class _ThreadMutedStream(io.TextIOBase):
+    """Stream proxy that drops writes from one thread and forwards all others"""
+    
+    def __init__(self, stream, thread_id: int):
+        self._stream = stream
+        self._thread_id = thread_id
+    
+    def write(self, text: str) -> int:
+        if threading.get_ident() == self._thread_id:
+            return len(text)
+        return self._stream.write(text)
+    
+    def flush(self) -> None:
+        self._stream.flush()
 
 class SpeechEngine:
     """Handles text-to-speech output"""
@@ -18,12 +42,28 @@ class SpeechEngine:
     def __init__(self):
         """Initialize the speech engine"""
         self.engine = None
-        self.speech_queue = Queue()
+        # Queue and worker live on the shared event loop, all TTS calls run on the one "tts" thread
+        self.speech_queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=Config.TTS_QUEUE_MAX)
         self.is_speaking = False
-        self.speech_thread = None
         self.is_running = False
+        self.voice_id: Optional[str] = None
+        self.piper_voice = None
+        self._loop = get_event_loop()
+        self._worker: Optional[Future] = None
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        
+        # Set when pyttsx3 runs in our own loop instead of a runAndWait() per phrase
+        self._external_loop = False
+        self._utterance_done = threading.Event()
+        
+        # Rendered WAV audio keyed by text and voice settings (needs aplay for playback)
+        self._audio_cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._player_path = shutil.which("aplay")
+        self._player: Optional[subprocess.Popen] = None
         
         self._initialize_engine()
+        if Config.TTS_BACKEND == "piper":
+            self._initialize_piper()
         self._start_speech_worker()
     
     def _initialize_engine(self) -> None:
@@ -37,60 +77,231 @@ class SpeechEngine:
             # Configure volume
             self.engine.setProperty('volume', Config.TTS_VOLUME)
             
+            # Completion signal for the external event loop
+            self.engine.connect('finished-utterance', self._on_utterance_finished)
+            
             # Configure voice (if available)
             voices = self.engine.getProperty('voices')
             if voices and len(voices) > Config.TTS_VOICE_INDEX:
                 self.engine.setProperty('voice', voices[Config.TTS_VOICE_INDEX].id)
-                logger.info(f"Using voice: {voices[Config.TTS_VOICE_INDEX].name}")
+                self.voice_id = voices[Config.TTS_VOICE_INDEX].id
+                logger.info("Using voice: %s", voices[Config.TTS_VOICE_INDEX].name)
             else:
                 logger.warning("Requested voice index not available, using default")
             
             logger.info("Speech engine initialized successfully")
             
         except Exception as e:
-            logger.error(f"Failed to initialize speech engine: {e}")
+            logger.error("Failed to initialize speech engine: %s", e)
             raise
     
+    def _initialize_piper(self) -> None:
+        """Load the Piper neural voice, keeping pyttsx3 as the fallback"""
+        if not self._player_path:
+            logger.warning("Piper TTS needs aplay for playback, using pyttsx3")
+            return
+        
+        try:
+            from piper import PiperVoice
+            self.piper_voice = PiperVoice.load(Config.PIPER_MODEL_PATH, config_path=Config.PIPER_CONFIG_PATH)
+            self.voice_id = f"piper:{Config.PIPER_MODEL_PATH}"
+            logger.info("Using Piper voice: %s", Config.PIPER_MODEL_PATH)
+        except Exception as e:
+            logger.warning("Failed to load Piper voice, using pyttsx3: %s", e)
+            self.piper_voice = None
+    
     def _start_speech_worker(self) -> None:
-        """Start the speech worker thread"""
+        """Start the speech worker task on the shared event loop"""
         self.is_running = True
-        self.speech_thread = threading.Thread(target=self._speech_worker, daemon=True)
-        self.speech_thread.start()
-        logger.info("Speech worker thread started")
+        self._worker = asyncio.run_coroutine_threadsafe(self._speech_worker(), self._loop)
+        logger.info("Speech worker task started")
     
-    def _speech_worker(self) -> None:
-        """Worker thread to handle speech queue"""
-        while self.is_running:
+    async def _speech_worker(self) -> None:
+        """Worker task to handle speech queue"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._exec, self._preload_audio)
+        await loop.run_in_executor(self._exec, self._start_engine_loop)
+        
+        while True:
+            text = await self.speech_queue.get()
             try:
-                # Get text from queue (blocks until available)
-                text = self.speech_queue.get(timeout=1)
-                
                 if text is None:  # Shutdown signal
                     break
                 
-                self._speak_now(text)
-                self.speech_queue.task_done()
+                await loop.run_in_executor(self._exec, self._speak_now, text)
                 
             except Exception as e:
                 if self.is_running:  # Only log if not shutting down
-                    logger.error(f"Error in speech worker: {e}")
+                    logger.error("Error in speech worker: %s", e)
+            finally:
+                self.speech_queue.task_done()
+        
+        await loop.run_in_executor(self._exec, self._end_engine_loop)
+    
+    def _end_engine_loop(self) -> None:
+        """Close the pyttsx3 driver loop opened by _start_engine_loop"""
+        if self._external_loop:
+            self._external_loop = False
+            try:
+                self.engine.endLoop()
+            except RuntimeError:
+                pass
+    
+    def _start_engine_loop(self) -> None:
+        """Keep the pyttsx3 driver loop open for the whole session"""
+        try:
+            self.engine.startLoop(False)
+        except RuntimeError as e:
+            logger.warning("Could not start speech engine loop: %s", e)
+            return
+        
+        try:
+            # Only drivers whose iterate() is a generator (sapi5, avspeech) can be pumped from
+            # outside. pyttsx3 2.99's espeak driver returns None here, so on the Raspberry Pi
+            # this probe fails and speech keeps using runAndWait()
+            self.engine.iterate()
+        except Exception as e:
+            logger.info("Speech driver has no external loop support, using runAndWait: %s", e)
+            self.engine.endLoop()
+            return
+        
+        self._external_loop = True
+        logger.debug("Speech engine loop started")
+    
+    def _on_utterance_finished(self, name: Optional[str], completed: bool) -> None:
+        """pyttsx3 callback fired when an utterance completes or is stopped"""
+        self._utterance_done.set()
+    
+    def _run_engine(self, text: str) -> None:
+        """Process the commands queued on the pyttsx3 engine, blocking until done"""
+        if not self._external_loop:
+            self.engine.runAndWait()
+            return
+        
+        # Not every driver reports the end of an utterance, so allow twice the expected
+        # speaking time and also stop once the driver goes idle
+        deadline = time.monotonic() + 5.0 + 2 * 60.0 * len(text.split()) / Config.TTS_RATE
+        was_busy = False
+        while self.is_running and not self._utterance_done.wait(0.01):
+            self.engine.iterate()
+            busy = self.engine.isBusy()
+            if was_busy and not busy:
+                break
+            was_busy = was_busy or busy
+            if time.monotonic() > deadline:
+                logger.warning("Speech engine did not finish the utterance in time")
+                self.engine.stop()
+                break
     
     def _speak_now(self, text: str) -> None:
         """Immediately speak the given text"""
         try:
             self.is_speaking = True
-            logger.info(f"Speaking: '{text}'")
+            logger.info("Speaking: '%s'", text)
             
-            self.engine.say(text)
-            self.engine.runAndWait()
+            audio = self._get_audio(text) if self._player_path else None
+            if audio:
+                self._play_audio(audio)
+            else:
+                self._utterance_done.clear()
+                self.engine.say(text)
+                self._run_engine(text)
             
             self.is_speaking = False
             logger.debug("Finished speaking")
             
         except Exception as e:
-            logger.error(f"Error speaking text: {e}")
+            logger.error("Error speaking text: %s", e)
             self.is_speaking = False
     
+    def _preload_audio(self) -> None:
+        """Render the fixed phrases so they play without synthesis delay"""
+        if not self._player_path:
+            logger.info("aplay not found, speech audio caching disabled")
+            return
+        
+        for text in (Config.GREETING_MESSAGE, Config.FAREWELL_MESSAGE, Config.ERROR_MESSAGE):
+            self._get_audio(text)
+        logger.debug("Preloaded %s phrases", len(self._audio_cache))
+    
+    def _get_audio(self, text: str) -> Optional[bytes]:
+        """Get rendered audio for text, synthesizing it on a cache miss"""
+        key = hashlib.blake2b(
+            f"{text}\0{Config.TTS_RATE}\0{Config.TTS_VOLUME}\0{self.voice_id}".encode(),
+            digest_size=16
+        ).digest()
+        
+        audio = self._audio_cache.get(key)
+        if audio is not None:
+            self._audio_cache.move_to_end(key)
+            return audio
+        
+        audio = self._synthesize(text)
+        if audio:
+            self._audio_cache[key] = audio
+            if len(self._audio_cache) > Config.TTS_CACHE_SIZE:
+                self._audio_cache.popitem(last=False)
+        return audio
+    
+    def _synthesize(self, text: str) -> Optional[bytes]:
+        """Render text to WAV audio with the TTS engine"""
+        if self.piper_voice:
+            audio = self._synthesize_piper(text)
+            if audio:
+                return audio
+        
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self._utterance_done.clear()
+            self.engine.save_to_file(text, path)
+            # The espeak driver prints "Audio saved to ..." for every file, keep it off the console
+            with contextlib.redirect_stdout(_ThreadMutedStream(sys.stdout, threading.get_ident())):
+                self._run_engine(text)
+            with open(path, "rb") as f:
+                return f.read() or None
+        except Exception as e:
+            logger.error("Error rendering speech audio: %s", e)
+            return None
+        finally:
+            self._reset_save_target()
+            os.remove(path)
+    
+    def _reset_save_target(self) -> None:
+        """Stop the driver from reusing the last save_to_file() target for say()"""
+        # pyttsx3 2.99's espeak driver keeps _save_file set, so a later say() would
+        # write to the deleted temp file instead of playing
+        driver = getattr(getattr(self.engine, "proxy", None), "_driver", None)
+        if getattr(driver, "_save_file", None) is not None:
+            driver._save_file = None
+    
+    def _synthesize_piper(self, text: str) -> Optional[bytes]:
+        """Render text to WAV audio with the Piper voice"""
+        try:
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav_file:
+                # piper-tts 1.3 renamed synthesize() to synthesize_wav()
+                synthesize = getattr(self.piper_voice, "synthesize_wav", None) or self.piper_voice.synthesize
+                synthesize(text, wav_file)
+            return buffer.getvalue()
+        except Exception as e:
+            logger.error("Error rendering speech with Piper: %s", e)
+            return None
+    
+    def _play_audio(self, audio: bytes) -> None:
+        """Play rendered WAV audio, blocking until it finishes or is stopped"""
+        self._player = subprocess.Popen(
+            [self._player_path, "-q", "-"],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            self._player.communicate(audio)
+        except (BrokenPipeError, ValueError):
+            pass  # Playback was stopped
+        finally:
+            self._player = None
+    
     def speak(self, text: str, interrupt: bool = False) -> None:
         """
         Add text to the speech queue
@@ -103,17 +314,32 @@ class SpeechEngine:
             return
         
         if interrupt:
-            # Clear the queue and stop current speech
+            # Stop current speech, the queue is cleared on the event loop
             self.stop_speaking()
-            while not self.speech_queue.empty():
-                try:
-                    self.speech_queue.get_nowait()
-                    self.speech_queue.task_done()
-                except:
-                    break
         
-        self.speech_queue.put(text)
-        logger.debug(f"Added to speech queue: '{text[:50]}...'")
+        self._loop.call_soon_threadsafe(self._enqueue, text, interrupt)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Added to speech queue: '%s...'", text[:50])
+    
+    def _enqueue(self, text: Optional[str], clear: bool = False) -> None:
+        """Add text to the speech queue (runs on the event loop)"""
+        if clear:
+            self._clear_queue()
+        
+        try:
+            self.speech_queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # Keep the newest speech, the oldest queued phrase is the most stale
+            self.speech_queue.get_nowait()
+            self.speech_queue.task_done()
+            self.speech_queue.put_nowait(text)
+            logger.warning("Speech queue full, dropped oldest phrase")
+    
+    def _clear_queue(self) -> None:
+        """Discard all queued speech (runs on the event loop)"""
+        while not self.speech_queue.empty():
+            self.speech_queue.get_nowait()
+            self.speech_queue.task_done()
     
     def speak_immediately(self, text: str) -> None:
         """Speak text immediately, bypassing the queue"""
@@ -123,22 +349,21 @@ class SpeechEngine:
         # Stop current speech and clear queue
         self.stop_speaking()
         
-        # Speak in a separate thread to avoid blocking
-        speech_thread = threading.Thread(
-            target=self._speak_now, 
-            args=(text,), 
-            daemon=True
-        )
-        speech_thread.start()
+        # Speak on the TTS thread to avoid blocking
+        self._exec.submit(self._speak_now, text)
     
     def stop_speaking(self) -> None:
         """Stop current speech"""
         try:
             if self.engine and self.is_speaking:
-                self.engine.stop()
+                player = self._player
+                if player:
+                    player.terminate()
+                else:
+                    self.engine.stop()
                 logger.debug("Stopped current speech")
         except Exception as e:
-            logger.error(f"Error stopping speech: {e}")
+            logger.error("Error stopping speech: %s", e)
     
     def is_busy(self) -> bool:
         """Check if the speech engine is currently speaking"""
@@ -155,12 +380,19 @@ class SpeechEngine:
             True if completed, False if timeout
         """
         try:
-            self.speech_queue.join()  # Wait for all tasks to complete
+            run_coroutine(asyncio.wait_for(self._drain(), timeout))
             return True
+        except TimeoutError:
+            return False
         except Exception as e:
-            logger.error(f"Error waiting for speech completion: {e}")
+            logger.error("Error waiting for speech completion: %s", e)
             return False
     
+    async def _drain(self) -> None:
+        """Wait for queued speech and anything passed to speak_immediately()"""
+        await self.speech_queue.join()
+        await asyncio.get_running_loop().run_in_executor(self._exec, lambda: None)
+    
     def shutdown(self) -> None:
         """Shutdown the speech engine"""
         logger.info("Shutting down speech engine...")
@@ -168,18 +400,17 @@ class SpeechEngine:
         self.is_running = False
         
         # Clear queue and add shutdown signal
-        while not self.speech_queue.empty():
-            try:
-                self.speech_queue.get_nowait()
-                self.speech_queue.task_done()
-            except:
-                break
+        self._loop.call_soon_threadsafe(self._enqueue, None, True)
         
-        self.speech_queue.put(None)  # Shutdown signal
+        # Wait for worker task to finish
+        if self._worker:
+            try:
+                self._worker.result(timeout=2)
+            except Exception:
+                pass
+            self._worker = None
         
-        # Wait for worker thread to finish
-        if self.speech_thread and self.speech_thread.is_alive():
-            self.speech_thread.join(timeout=2)
+        self._exec.shutdown(wait=False, cancel_futures=True)
         
         # Cleanup engine
         if self.engine:
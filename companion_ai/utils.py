@@ -1,11 +1,21 @@
 """
 Utility functions and helpers for the Companion AI
 """
+import asyncio
+import functools
 import logging
+import platform
+import re
 import sys
+import threading
 import time
-from datetime import datetime
-from typing import Optional
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 # Configure logging
 def setup_logger(name: str = "companion_ai", level: int = logging.INFO) -> logging.Logger:
@@ -34,6 +44,24 @@ def setup_logger(name: str = "companion_ai", level: int = logging.INFO) -> loggi
 # Global logger instance
 logger = setup_logger()
 
+# Shared background event loop for async I/O (OpenAI requests etc.)
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared background event loop, starting it on first use"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_event_loop.run_forever, name="haro-event-loop", daemon=True)
+            thread.start()
+    return _event_loop
+
+def run_coroutine(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
+
 def print_banner():
     """Print application banner"""
     banner = """
@@ -45,32 +73,58 @@ def print_banner():
     """
     print(banner)
 
+# Last status timestamp, reformatted only when the second changes
+_status_second = -1
+_status_timestamp = ""
+
+def _get_status_timestamp() -> str:
+    """Get the current HH:MM:SS timestamp for status messages"""
+    global _status_second, _status_timestamp
+    now = int(time.time())
+    if now != _status_second:
+        _status_timestamp = time.strftime("%H:%M:%S", time.localtime(now))
+        _status_second = now
+    return _status_timestamp
+
+_STATUS = {
+    "INFO": "ℹ",
+    "SUCCESS": "✓",
+    "WARNING": "⚠",
+    "ERROR": "✗",
+    "LISTENING": "🎤",
+    "SPEAKING": "🔊",
+    "THINKING": "🤔"
+}
+
 def print_status(message: str, status_type: str = "INFO"):
     """Print formatted status message"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    symbols = {
-        "INFO": "ℹ",
-        "SUCCESS": "✓",
-        "WARNING": "⚠",
-        "ERROR": "✗",
-        "LISTENING": "🎤",
-        "SPEAKING": "🔊",
-        "THINKING": "🤔"
-    }
-    
-    symbol = symbols.get(status_type, "•")
-    print(f"[{timestamp}] {symbol} {message}")
+    sys.stdout.write(f"[{_get_status_timestamp()}] {_STATUS.get(status_type, '•')} {message}\n")
+
+# ASCII lowercasing plus punctuation removal, applied in a single pass
+_NORMALIZE_TABLE = str.maketrans({
+    **{c: c + 32 for c in range(ord("A"), ord("Z") + 1)},
+    **{ord(c): None for c in ".,!?;:\""}
+})
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and strip punctuation and surrounding whitespace"""
+    return text.translate(_NORMALIZE_TABLE).strip()
+
+# Whitespace following the end of a sentence
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def split_sentences(text: str) -> List[str]:
+    """Split text at sentence ends, the last item is the (possibly unfinished) remainder"""
+    return _SENTENCE_END_RE.split(text)
 
 def format_duration(seconds: float) -> str:
     """Format duration in human-readable format"""
-    if seconds < 1:
-        return f"{seconds*1000:.0f}ms"
-    elif seconds < 60:
+    if seconds < 1.0:
+        return f"{seconds * 1000.0:.0f}ms"
+    if seconds < 60.0:
         return f"{seconds:.1f}s"
-    else:
-        minutes = int(seconds // 60)
-        secs = seconds % 60
-        return f"{minutes}m {secs:.1f}s"
+    minutes, secs = divmod(seconds, 60.0)
+    return f"{int(minutes)}m {secs:.1f}s"
 
 def safe_float_convert(value: str, default: float = 0.0) -> float:
     """Safely convert string to float"""
@@ -88,9 +142,7 @@ def safe_int_convert(value: str, default: int = 0) -> int:
 
 def truncate_text(text: str, max_length: int = 50) -> str:
     """Truncate text to specified length"""
-    if len(text) <= max_length:
-        return text
-    return text[:max_length-3] + "..."
+    return text if len(text) <= max_length else f"{text[:max_length-3]}..."
 
 def validate_audio_setup() -> bool:
     """Validate audio setup on the system"""
@@ -113,29 +165,37 @@ def validate_audio_setup() -> bool:
         return True
         
     except Exception as e:
-        logger.error(f"Audio setup validation failed: {e}")
+        logger.error("Audio setup validation failed: %s", e)
         return False
 
+@functools.lru_cache(maxsize=1)
 def get_system_info() -> dict:
-    """Get system information for debugging"""
-    import platform
-    import psutil
-    
+    """Get system information for debugging (collected once per run)"""
     try:
         info = {
             "platform": platform.platform(),
             "python_version": platform.python_version(),
-            "cpu_count": psutil.cpu_count(),
-            "memory_total": f"{psutil.virtual_memory().total / (1024**3):.1f} GB",
-            "memory_available": f"{psutil.virtual_memory().available / (1024**3):.1f} GB",
         }
+        if psutil is not None:
+            memory = psutil.virtual_memory()
+            info["cpu_count"] = psutil.cpu_count()
+            info["memory_total"] = f"{memory.total / (1024**3):.1f} GB"
+            info["memory_available"] = f"{memory.available / (1024**3):.1f} GB"
         return info
     except Exception as e:
-        logger.error(f"Error getting system info: {e}")
+        logger.error("Error getting system info: %s", e)
         return {}
 
+@functools.lru_cache(maxsize=1)
 def check_raspberry_pi() -> bool:
     """Check if running on Raspberry Pi"""
+    # The device tree model is a single short read on Pi OS
+    try:
+        if "Raspberry Pi" in Path("/sys/firmware/devicetree/base/model").read_text(errors="ignore"):
+            return True
+    except OSError:
+        pass
+    
     try:
         with open('/proc/cpuinfo', 'r') as f:
             cpuinfo = f.read()
@@ -147,29 +207,29 @@ class PerformanceMonitor:
     """Simple performance monitoring utility"""
     
     def __init__(self):
-        self.start_time = None
-        self.measurements = {}
+        self._starts: Dict[str, int] = {}  # Monotonic start times in ns
+        self._durations: Dict[str, int] = {}  # Measured durations in ns
     
     def start(self, name: str = "default"):
         """Start timing measurement"""
-        self.start_time = time.time()
-        self.measurements[name] = {"start": self.start_time}
+        self._starts[name] = time.perf_counter_ns()
     
     def stop(self, name: str = "default") -> float:
         """Stop timing measurement and return duration"""
-        if name not in self.measurements:
+        start = self._starts.pop(name, None)
+        if start is None:
             return 0.0
         
-        end_time = time.time()
-        duration = end_time - self.measurements[name]["start"]
-        self.measurements[name]["duration"] = duration
-        return duration
+        duration = time.perf_counter_ns() - start
+        self._durations[name] = duration
+        return duration * 1e-9
     
     def get_measurement(self, name: str = "default") -> Optional[float]:
         """Get measurement duration"""
-        return self.measurements.get(name, {}).get("duration")
+        duration = self._durations.get(name)
+        return duration * 1e-9 if duration is not None else None
     
     def reset(self):
         """Reset all measurements"""
-        self.measurements.clear()
-        self.start_time = None
+        self._starts.clear()
+        self._durations.clear()
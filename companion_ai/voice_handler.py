@@ -1,16 +1,169 @@
 """
 Voice recognition handler for the Companion AI
 """
+import functools
+import json
+import os
 import speech_recognition as sr
 import threading
 import time
-from typing import Optional, Callable
-try:
-    from .config import Config
-    from .utils import logger
-except ImportError:
-    from config import Config
-    from utils import logger
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional
+from .config import Config
+from .utils import logger
+
+class LocalRecognizer:
+    """Offline speech recognition using Vosk or faster-whisper"""
+    
+    SAMPLE_RATE = 16000
+    
+    def __init__(self, backend: str):
+        """
+        Load the local speech recognition model
+        
+        Args:
+            backend: "vosk" (lightweight, suits Raspberry Pi) or "whisper" (faster-whisper, int8)
+        """
+        self.backend = backend
+        self._lock = threading.Lock()
+        
+        if backend == "vosk":
+            from vosk import Model, KaldiRecognizer
+            self._model = KaldiRecognizer(Model(Config.VOSK_MODEL_PATH), self.SAMPLE_RATE)
+        elif backend == "whisper":
+            from faster_whisper import WhisperModel
+            self._model = WhisperModel(Config.WHISPER_MODEL, device="cpu", compute_type="int8")
+        else:
+            raise ValueError(f"Unknown local speech recognition backend: {backend}")
+        
+        logger.info("Local speech recognition ready (%s)", backend)
+    
+    def recognize(self, audio: sr.AudioData) -> str:
+        """
+        Transcribe audio
+        
+        Args:
+            audio: Captured audio
+            
+        Returns:
+            Recognized text
+            
+        Raises:
+            sr.UnknownValueError: If no speech was recognized
+        """
+        pcm = audio.get_raw_data(convert_rate=self.SAMPLE_RATE, convert_width=2)
+        
+        # Models are not safe to share between recognition threads
+        with self._lock:
+            if self.backend == "vosk":
+                self._model.AcceptWaveform(pcm)
+                text = json.loads(self._model.FinalResult()).get("text", "")
+            else:
+                import numpy as np
+                samples = np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+                segments, _ = self._model.transcribe(samples, beam_size=1, language="en")
+                text = " ".join(segment.text.strip() for segment in segments)
+        
+        if not text.strip():
+            raise sr.UnknownValueError()
+        return text.strip()
+
+class VadListener:
+    """Phrase capture using WebRTC voice activity detection instead of the energy threshold"""
+    
+    SAMPLE_RATE = 16000
+    FRAME_MS = 30
+    FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+    PRE_ROLL_FRAMES = 10  # Audio kept from before speech is detected
+    START_FRAMES = 3  # Consecutive speech frames that start a phrase
+    MAX_PHRASE_FRAMES = 5000 // FRAME_MS  # Same 5 second limit as the energy listener
+    
+    def __init__(self, on_phrase: Callable[[sr.AudioData], None], device_index: Optional[int] = None):
+        """
+        Open the WebRTC voice activity detector and PyAudio
+        
+        Args:
+            on_phrase: Called with each captured phrase
+            device_index: PyAudio input device, default device if None
+        """
+        import pyaudio
+        import webrtcvad
+        
+        self.on_phrase = on_phrase
+        self.device_index = device_index
+        self._vad = webrtcvad.Vad(Config.VAD_AGGRESSIVENESS)
+        self._pyaudio_class = pyaudio.PyAudio
+        self._pyaudio = None
+        self._format = pyaudio.paInt16
+        self._stream = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # Silent frames that end a phrase
+        self._hangover_frames = max(1, int(Config.PHRASE_TIMEOUT * 1000) // self.FRAME_MS)
+    
+    def start(self) -> None:
+        """Open the microphone stream and start capturing phrases"""
+        self._pyaudio = self._pyaudio_class()
+        self._stream = self._pyaudio.open(
+            format=self._format,
+            channels=1,
+            rate=self.SAMPLE_RATE,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.FRAME_SAMPLES
+        )
+        self._running = True
+        self._thread = threading.Thread(target=self._capture, name="vad", daemon=True)
+        self._thread.start()
+        logger.info("WebRTC voice activity detection started")
+    
+    def stop(self) -> None:
+        """Stop capturing and close the microphone stream"""
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+    
+    def _capture(self) -> None:
+        """Read 30 ms frames and emit each run of speech as one phrase"""
+        pre_roll: Deque[bytes] = deque(maxlen=self.PRE_ROLL_FRAMES)
+        frames: List[bytes] = []
+        speech_run = 0
+        silence_run = 0
+        
+        while self._running:
+            try:
+                frame = self._stream.read(self.FRAME_SAMPLES, exception_on_overflow=False)
+                is_speech = self._vad.is_speech(frame, self.SAMPLE_RATE)
+            except Exception as e:
+                if self._running:
+                    logger.error("Error reading microphone: %s", e)
+                break
+            
+            if not frames:
+                # Waiting for speech, keep a little audio from before it started
+                pre_roll.append(frame)
+                speech_run = speech_run + 1 if is_speech else 0
+                if speech_run >= self.START_FRAMES:
+                    frames.extend(pre_roll)
+                    pre_roll.clear()
+                    silence_run = 0
+                continue
+            
+            frames.append(frame)
+            silence_run = 0 if is_speech else silence_run + 1
+            if silence_run >= self._hangover_frames or len(frames) >= self.MAX_PHRASE_FRAMES:
+                self.on_phrase(sr.AudioData(b"".join(frames), self.SAMPLE_RATE, 2))
+                frames = []
+                speech_run = 0
 
 class VoiceHandler:
     """Handles voice recognition and audio input processing"""
@@ -26,12 +179,22 @@ class VoiceHandler:
         self.microphone = None
         self.on_speech_detected = on_speech_detected
         self.is_listening = False
-        self.listen_thread = None
+        self._stop_background: Optional[Callable[..., None]] = None
+        self._exec: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=2, thread_name_prefix="asr")
+        self.local_recognizer: Optional[LocalRecognizer] = None
+        self.vad_listener: Optional[VadListener] = None
+        self._wake_re = Config.WAKE_RE
+        
+        if Config.ASR_BACKEND != "google":
+            self.local_recognizer = LocalRecognizer(Config.ASR_BACKEND)
+        if Config.VAD_BACKEND == "webrtc":
+            self.vad_listener = VadListener(functools.partial(self._on_audio, self.recognizer), Config.MICROPHONE_INDEX)
         
         # Configure recognizer settings
         self.recognizer.energy_threshold = Config.ENERGY_THRESHOLD
         self.recognizer.timeout = Config.TIMEOUT
         self.recognizer.phrase_timeout = Config.PHRASE_TIMEOUT
+        self.recognizer.dynamic_energy_threshold = True  # Keep tracking noise during the session
         
         self._setup_microphone()
     
@@ -40,103 +203,142 @@ class VoiceHandler:
         try:
             # List available microphones for debugging
             mic_list = sr.Microphone.list_microphone_names()
-            logger.info(f"Available microphones: {len(mic_list)} found")
+            logger.info("Available microphones: %s found", len(mic_list))
             
             # Use specified microphone index or default
             if Config.MICROPHONE_INDEX is not None:
                 self.microphone = sr.Microphone(device_index=Config.MICROPHONE_INDEX)
-                logger.info(f"Using microphone index: {Config.MICROPHONE_INDEX}")
+                logger.info("Using microphone index: %s", Config.MICROPHONE_INDEX)
             else:
                 self.microphone = sr.Microphone()
                 logger.info("Using default microphone")
             
-            # Adjust for ambient noise
-            logger.info("Adjusting for ambient noise... Please wait.")
-            with self.microphone as source:
-                self.recognizer.adjust_for_ambient_noise(source, duration=2)
-            logger.info(f"Ambient noise adjustment complete. Energy threshold: {self.recognizer.energy_threshold}")
+            # WebRTC capture does not use the energy threshold
+            if self.vad_listener:
+                return
+            
+            # Adjust for ambient noise, starting from a recent calibration if there is one
+            saved_threshold = self._load_noise_calibration()
+            if saved_threshold is not None:
+                logger.info("Using saved noise calibration, checking briefly...")
+                self.recognizer.energy_threshold = saved_threshold
+                with self.microphone as source:
+                    self.recognizer.adjust_for_ambient_noise(source, duration=0.2)
+            else:
+                logger.info("Adjusting for ambient noise... Please wait.")
+                with self.microphone as source:
+                    self.recognizer.adjust_for_ambient_noise(source, duration=2)
+                self._save_noise_calibration()
+            logger.info("Ambient noise adjustment complete. Energy threshold: %s", self.recognizer.energy_threshold)
             
         except Exception as e:
-            logger.error(f"Failed to setup microphone: {e}")
+            logger.error("Failed to setup microphone: %s", e)
             raise
     
+    @staticmethod
+    def _noise_calibration_path() -> str:
+        """Get the file used to persist the ambient noise calibration"""
+        return os.path.join(Config.CACHE_DIR, "noise.json")
+    
+    def _load_noise_calibration(self) -> Optional[float]:
+        """Get the saved energy threshold if it is recent enough"""
+        try:
+            with open(self._noise_calibration_path()) as f:
+                data = json.load(f)
+            if time.time() - data["ts"] < Config.NOISE_CALIBRATION_MAX_AGE:
+                return float(data["threshold"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug("No usable noise calibration: %s", e)
+        return None
+    
+    def _save_noise_calibration(self) -> None:
+        """Save the current energy threshold for the next startup"""
+        try:
+            os.makedirs(Config.CACHE_DIR, exist_ok=True)
+            with open(self._noise_calibration_path(), "w") as f:
+                json.dump({"threshold": self.recognizer.energy_threshold, "ts": time.time()}, f)
+        except OSError as e:
+            logger.warning("Failed to save noise calibration: %s", e)
+    
     def start_listening(self) -> None:
-        """Start continuous voice recognition in a separate thread"""
+        """Start continuous voice recognition in the background"""
         if self.is_listening:
             logger.warning("Voice handler is already listening")
             return
         
         self.is_listening = True
-        self.listen_thread = threading.Thread(target=self._listen_continuously, daemon=True)
-        self.listen_thread.start()
+        if self._exec is None:
+            self._exec = ThreadPoolExecutor(max_workers=2, thread_name_prefix="asr")
+        
+        # Keeps the microphone stream open and calls back with each captured phrase
+        if self.vad_listener:
+            self.vad_listener.start()
+        else:
+            self._stop_background = self.recognizer.listen_in_background(
+                self.microphone, self._on_audio, phrase_time_limit=5
+            )
         logger.info("Voice recognition started")
     
     def stop_listening(self) -> None:
         """Stop voice recognition"""
         self.is_listening = False
-        if self.listen_thread and self.listen_thread.is_alive():
-            self.listen_thread.join(timeout=2)
+        if self._stop_background:
+            self._stop_background(wait_for_stop=False)
+            self._stop_background = None
+        if self.vad_listener:
+            self.vad_listener.stop()
+        if self._exec:
+            self._exec.shutdown(wait=False, cancel_futures=True)
+            self._exec = None
         logger.info("Voice recognition stopped")
     
-    def _listen_continuously(self) -> None:
-        """Continuously listen for voice input"""
-        while self.is_listening:
-            try:
-                # Listen for audio input
-                with self.microphone as source:
-                    logger.debug("Listening for speech...")
-                    audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
-                
-                # Recognize speech in a separate thread to avoid blocking
-                recognition_thread = threading.Thread(
-                    target=self._process_audio, 
-                    args=(audio,), 
-                    daemon=True
-                )
-                recognition_thread.start()
-                
-            except sr.WaitTimeoutError:
-                # No speech detected within timeout - this is normal
-                continue
-            except Exception as e:
-                logger.error(f"Error in continuous listening: {e}")
-                time.sleep(1)  # Brief pause before retrying
+    def _on_audio(self, recognizer: sr.Recognizer, audio: sr.AudioData) -> None:
+        """Hand a captured phrase to the recognition pool so capture can continue"""
+        logger.debug("Captured phrase, queueing for recognition")
+        executor = self._exec
+        if executor:
+            executor.submit(self._process_audio, audio)
     
     def _process_audio(self, audio: sr.AudioData) -> None:
         """Process audio data and recognize speech"""
         try:
             logger.debug("Processing audio...")
             
-            # Use Google Speech Recognition (free)
-            text = self.recognizer.recognize_google(audio)
-            logger.info(f"Recognized speech: '{text}'")
+            text = self._recognize(audio)
+            logger.info("Recognized speech: '%s'", text)
+            
+            lower = text.lower()
+            if not lower:
+                return
             
             # Check if wake word is present or if we're in active conversation
-            if self._contains_wake_word(text.lower()):
-                # Remove wake word and process the command
-                cleaned_text = self._remove_wake_words(text.lower()).strip()
-                if cleaned_text:
-                    self.on_speech_detected(cleaned_text)
-                else:
-                    # Just wake word, acknowledge
-                    self.on_speech_detected("Hello! How can I help you?")
+            if self._contains_wake_word(lower):
+                # Remove wake word and process the command, just a wake word gets an acknowledgement
+                cleaned_text = self._remove_wake_words(lower)
+                self.on_speech_detected(cleaned_text or "Hello! How can I help you?")
             
         except sr.UnknownValueError:
             logger.debug("Could not understand audio")
         except sr.RequestError as e:
-            logger.error(f"Speech recognition request failed: {e}")
+            logger.error("Speech recognition request failed: %s", e)
         except Exception as e:
-            logger.error(f"Error processing audio: {e}")
+            logger.error("Error processing audio: %s", e)
+    
+    def _recognize(self, audio: sr.AudioData) -> str:
+        """Recognize speech with the configured backend"""
+        if self.local_recognizer:
+            return self.local_recognizer.recognize(audio)
+        
+        # Use Google Speech Recognition (free, needs internet)
+        return self.recognizer.recognize_google(audio)
     
     def _contains_wake_word(self, text: str) -> bool:
         """Check if text contains any wake words"""
-        return any(wake_word in text for wake_word in Config.WAKE_WORDS)
+        return bool(self._wake_re.search(text))
     
     def _remove_wake_words(self, text: str) -> str:
         """Remove wake words from text"""
-        for wake_word in Config.WAKE_WORDS:
-            text = text.replace(wake_word, "").strip()
-        return text
+        return self._wake_re.sub("", text).strip()
     
     def listen_once(self) -> Optional[str]:
         """Listen for a single phrase (for testing purposes)"""
@@ -145,16 +347,16 @@ class VoiceHandler:
             with self.microphone as source:
                 audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=5)
             
-            text = self.recognizer.recognize_google(audio)
-            logger.info(f"Recognized: '{text}'")
+            text = self._recognize(audio)
+            logger.info("Recognized: '%s'", text)
             return text
             
         except sr.UnknownValueError:
             logger.warning("Could not understand audio")
             return None
         except sr.RequestError as e:
-            logger.error(f"Speech recognition request failed: {e}")
+            logger.error("Speech recognition request failed: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Error in single listen: {e}")
+            logger.error("Error in single listen: %s", e)
             return None